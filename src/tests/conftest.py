@@ -1,6 +1,9 @@
 """Pytest configuration and fixtures for TWR tests."""
 
+import datetime
+import operator
 import uuid
+from collections import defaultdict
 from typing import Any, Callable, Generator, Union
 
 import psycopg2
@@ -8,15 +11,43 @@ import pytest
 from psycopg2.extensions import connection as Connection
 from testcontainers.postgres import PostgresContainer
 
-from tests.utils import map_to_model, parse_time
+from tests.utils import map_to_model, parse_data, parse_time
 from twr.migrate import run_all_migrations
 from twr.models import (
+    CASHFLOW_COLUMNS,
+    PRICE_UPDATE_COLUMNS,
     Cashflow,
     CumulativeCashflow,
     PriceUpdate,
     UserProductTimelineBusinessEvent,
     UserTimelineBusinessEvent,
 )
+from twr.utils import CACHE_TABLES
+
+
+def _prepare_insert(name: str, table: str, columns: tuple[str, ...]) -> tuple[str, str]:
+    """Return the PREPARE statement for inserting into `table` and the EXECUTE template for it."""
+
+    parameters = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+    prepare = f"PREPARE {name} AS INSERT INTO {table} ({', '.join(columns)}) VALUES ({parameters})"
+    execute = f"EXECUTE {name} ({', '.join(['%s'] * len(columns))})"
+    return prepare, execute
+
+
+# Built once at import rather than per inserted object
+PREPARE_INSERT_PRICE_UPDATE, INSERT_PRICE_UPDATE = _prepare_insert(
+    "insert_price_update", "price_update", PRICE_UPDATE_COLUMNS
+)
+PREPARE_INSERT_CASHFLOW, INSERT_CASHFLOW = _prepare_insert(
+    "insert_cashflow", "cashflow", CASHFLOW_COLUMNS
+)
+
+# How `insert` writes each model: row values getter and prepared INSERT. Keyed by exact type so
+# that objects are routed with a dict lookup
+_INSERT_TARGETS: dict[type, tuple[Callable[[Any], Any], str]] = {
+    PriceUpdate: (operator.attrgetter(*PRICE_UPDATE_COLUMNS), INSERT_PRICE_UPDATE),
+    Cashflow: (operator.attrgetter(*CASHFLOW_COLUMNS), INSERT_CASHFLOW),
+}
 
 
 @pytest.fixture(scope="session")
@@ -35,23 +66,50 @@ def db_connection(postgres_container: PostgresContainer) -> Generator[Connection
         database=postgres_container.dbname,
         user=postgres_container.username,
         password=postgres_container.password,
+        # Throwaway database: skip the WAL flush on every autocommitted statement, and don't let
+        # the planner spend time JIT-compiling the tests' tiny queries
+        options="-c synchronous_commit=off -c jit=off",
     )
     connection.autocommit = True
 
     # Run migrations
     run_all_migrations(connection=connection)
 
+    # The insert fixture runs these for every object; parse and plan them once per session
+    with connection.cursor() as cursor:
+        cursor.execute(PREPARE_INSERT_PRICE_UPDATE)
+        cursor.execute(PREPARE_INSERT_CASHFLOW)
+
     yield connection
     connection.close()
 
 
 @pytest.fixture
 def truncate(db_connection: Connection) -> None:
-    """Truncate tables before each test."""
+    """Truncate tables, including the caches built from them, before each test."""
 
     with db_connection.cursor() as cursor:
-        # Truncate tables in dependency order (CASCADE handles foreign keys)
-        cursor.execute("TRUNCATE TABLE cashflow, price_update CASCADE")
+        # The caches have no foreign keys to the base tables, so CASCADE does not reach them
+        cursor.execute(f"TRUNCATE TABLE cashflow, price_update, {', '.join(CACHE_TABLES)} CASCADE")
+
+
+@pytest.fixture
+def refresh_price_update(db_connection: Connection, truncate: None) -> Callable[..., None]:
+    """Refresh the `price_update_<suffix>` continuous aggregates for the given suffixes.
+
+    Always refreshes the whole range: `truncate` empties the hypertable between tests, so refreshing
+    only a window around the current test's data would leave stale buckets from earlier tests.
+    """
+
+    def fn(*suffixes: str) -> None:
+        with db_connection.cursor() as cursor:
+            for suffix in suffixes:
+                cursor.execute(
+                    "CALL refresh_continuous_aggregate(%s, NULL, NULL)",
+                    (f"price_update_{suffix}",),
+                )
+
+    return fn
 
 
 @pytest.fixture
@@ -121,7 +179,7 @@ def product() -> Callable[[str], str]:
 def make_data(
     product: Callable[[str], str],
     user: Callable[[str], str],
-    insert: Callable[[Union[PriceUpdate, Cashflow]], None],
+    insert: Callable[..., None],
 ) -> Callable[[str], None]:
     '''
     Usage:
@@ -139,80 +197,52 @@ def make_data(
     '''
 
     def fn(text: str) -> None:
-        price_updates = {}
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-        timestamps = [parse_time(t.strip()) for t in lines[0].split(",")]
-        for line in lines[1:]:
-            identifier, values = [t.strip() for t in line.split(":") if t.strip()]
-            match [w.strip() for w in identifier.split("/")]:
-                case [user_name, product_name]:
-                    units_str = [u.strip() for u in values.split(",")]
-                    for timestamp, unit_str in zip(timestamps, units_str):
-                        try:
-                            units = float(unit_str)
-                        except ValueError:
-                            continue
-                        price = sorted(
-                            [
-                                (t, p)
-                                for t, p in price_updates[product_name].items()
-                                if t <= timestamp
-                            ],
-                            key=lambda x: x[0],
-                            reverse=True,
-                        )[0][1]
-                        insert(
-                            Cashflow(
-                                user(user_name),
-                                product(product_name),
-                                timestamp,
-                                units,
-                                price,
-                                units * price,
-                            )
-                        )
-                case [product_name]:
-                    prices_str = [p.strip() for p in values.split(",")]
-                    for timestamp, price_str in zip(timestamps, prices_str):
-                        try:
-                            price = float(price_str)
-                        except ValueError:
-                            continue
-                        price_updates.setdefault(product_name, {})[timestamp] = price
-                        insert(PriceUpdate(product(product_name), timestamp, price))
+        price_updates: defaultdict[str, dict[datetime.datetime, float]] = defaultdict(dict)
+        objs: list[Union[PriceUpdate, Cashflow]] = []
+        for user_name, product_name, time, value in parse_data(text):
+            timestamp = parse_time(time)
+            if user_name is None:
+                price_updates[product_name][timestamp] = value
+                objs.append(PriceUpdate(product(product_name), timestamp, value))
+            else:
+                # Latest price at or before the cashflow; a linear scan, no need to sort them
+                price = max(
+                    (t, p) for t, p in price_updates[product_name].items() if t <= timestamp
+                )[1]
+                objs.append(
+                    Cashflow(
+                        user(user_name),
+                        product(product_name),
+                        timestamp,
+                        value,
+                        price,
+                        value * price,
+                    )
+                )
+        insert(*objs)
 
     return fn
 
 
 @pytest.fixture
-def insert(
-    db_connection: Connection, truncate: None
-) -> Callable[[Union[PriceUpdate, Cashflow]], None]:
-    """Insert data into the database using raw SQL (for more complex scenarios than make_data)."""
+def insert(db_connection: Connection, truncate: None) -> Callable[..., None]:
+    """Insert data into the database using raw SQL (for more complex scenarios than make_data).
 
-    def fn(obj: Union[PriceUpdate, Cashflow]) -> None:
-        if isinstance(obj, PriceUpdate):
-            with db_connection.cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO price_update (product_id, timestamp, price) VALUES (%s, %s, %s)",
-                    (obj.product_id, obj.timestamp, obj.price),
-                )
-        elif isinstance(obj, Cashflow):
-            with db_connection.cursor() as cursor:
-                cursor.execute(
-                    """INSERT INTO cashflow (user_id, product_id, timestamp, units_delta,
-                                             execution_price, user_money)
-                       VALUES (%s, %s, %s, %s, %s, %s)""",
-                    (
-                        obj.user_id,
-                        obj.product_id,
-                        obj.timestamp,
-                        obj.units_delta,
-                        obj.execution_price,
-                        obj.user_money,
-                    ),
-                )
-        else:
-            raise ValueError(f"Unsupported object type: {type(obj)}")
+    Any number of objects can be passed; all their INSERT statements are sent in one round-trip.
+    Each object gets its own statement, in the order given, so the cashflow repair trigger runs
+    after every row exactly as if the objects had been inserted one call at a time.
+    """
+
+    def fn(*objs: Union[PriceUpdate, Cashflow]) -> None:
+        with db_connection.cursor() as cursor:
+            statements = []
+            for obj in objs:
+                try:
+                    values, insert_sql = _INSERT_TARGETS[type(obj)]
+                except KeyError:
+                    raise ValueError(f"Unsupported object type: {type(obj)}") from None
+                statements.append(cursor.mogrify(insert_sql, values(obj)))
+            if statements:
+                cursor.execute(b";\n".join(statements))
 
     return fn
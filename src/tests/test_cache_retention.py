@@ -39,7 +39,8 @@ def test_repair_respects_retention_period_15min(
     query: QueryType,
     user: Callable[[str], str],
     product: Callable[[str], str],
-    insert: Callable[[PriceUpdate | Cashflow], None],
+    insert: Callable[..., None],
+    refresh_price_update: Callable[..., None],
 ) -> None:
     """Test that repair doesn't cache data outside 7-day retention period."""
     # Use current time as reference
@@ -51,7 +52,7 @@ def test_repair_respects_retention_period_15min(
     insert(Cashflow(user("Alice"), product("AAPL"), recent_time, 10, 100, 1001))
 
     # Refresh continuous aggregate
-    query("CALL refresh_continuous_aggregate('price_update_15min', NULL, NULL)")
+    refresh_price_update("15min")
 
     # Now insert out-of-order cashflow 10 days ago (outside 7 day retention)
     old_time = now - datetime.timedelta(days=10)
@@ -100,7 +101,8 @@ def test_view_works_with_retention(
     query: QueryType,
     user: Callable[[str], str],
     product: Callable[[str], str],
-    insert: Callable[[PriceUpdate | Cashflow], None],
+    insert: Callable[..., None],
+    refresh_price_update: Callable[..., None],
 ) -> None:
     """Test that views continue to work correctly even with retention filtering."""
     # Use current time as reference
@@ -114,7 +116,7 @@ def test_view_works_with_retention(
         insert(Cashflow(user("Alice"), product("AAPL"), timestamp, 1, price, price))
 
     # Refresh continuous aggregate
-    query("CALL refresh_continuous_aggregate('price_update_15min', NULL, NULL)")
+    refresh_price_update("15min")
 
     # Query function - should return all data within retention
     view_data = query(
@@ -140,7 +142,8 @@ def test_user_timeline_with_retention(
     query: QueryType,
     user: Callable[[str], str],
     product: Callable[[str], str],
-    insert: Callable[[PriceUpdate | Cashflow], None],
+    insert: Callable[..., None],
+    refresh_price_update: Callable[..., None],
 ) -> None:
     """Test that user_timeline aggregates correctly with retention."""
     # Use recent dates
@@ -153,7 +156,7 @@ def test_user_timeline_with_retention(
         insert(Cashflow(user("Alice"), product(prod), recent_time, 10, 100, 1001))
 
     # Refresh continuous aggregate
-    query("CALL refresh_continuous_aggregate('price_update_15min', NULL, NULL)")
+    refresh_price_update("15min")
 
     # Verify user_timeline aggregates portfolio correctly
     portfolio = query(
@@ -3,12 +3,13 @@
 from collections.abc import Callable
 from typing import Any, Protocol
 
+import pytest
+
 from tests.utils import (
     mock_ccf,
     mock_cf,
     mock_pu,
     mock_uptb,
-    mock_utb,
     parse_time,
 )
 from twr.models import (
@@ -55,19 +56,18 @@ def test_multiple_prices(
         AAPL:     10,    12
         GOOGL:    30,      ,    45
     """)
-    rows = query("""
+    # UUIDs sort differently than product names, so filter per product in the query instead of
+    # relying on the order of the full result
+    product_query = """
         SELECT product_id, "timestamp", price
         FROM price_update
-        ORDER BY product_id, "timestamp"
-    """)
-    # UUIDs sort differently than product names, so we need to check the results match
-    # regardless of order
-    assert len(rows) == 4
-    aapl_rows = [r for r in rows if isinstance(r, PriceUpdate) and r.product_id == product("AAPL")]
-    googl_rows = [
-        r for r in rows if isinstance(r, PriceUpdate) and r.product_id == product("GOOGL")
-    ]
+        WHERE product_id = %s
+        ORDER BY "timestamp"
+    """
+    aapl_rows = query(product_query, (product("AAPL"),))
+    googl_rows = query(product_query, (product("GOOGL"),))
 
+    assert query("SELECT COUNT(*) AS count FROM price_update") == [{"count": 4}]
     assert aapl_rows == [
         mock_pu(timestamp=parse_time("12:30"), price=10),
         mock_pu(timestamp=parse_time("12:40"), price=12),
@@ -78,27 +78,38 @@ def test_multiple_prices(
     ]
 
 
-def test_same_bucket(make_data: Callable[[str], None], query: QueryType) -> None:
-    make_data("""
-              12:05, 12:10
-        AAPL:    10,    15
-    """)
-    query("CALL refresh_continuous_aggregate('price_update_15min', NULL, NULL)")
-    rows = query("SELECT * FROM price_update_15min")
-    assert rows == [mock_pu(timestamp=parse_time("12:15"), price=15)]
-
-
-def test_different_buckets(make_data: Callable[[str], None], query: QueryType) -> None:
-    make_data("""
-              12:12, 12:17
-        AAPL:    10,    15
-    """)
-    query("CALL refresh_continuous_aggregate('price_update_15min', NULL, NULL)")
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        pytest.param(
+            """
+                  12:05, 12:10
+            AAPL:    10,    15
+            """,
+            [("12:15", 15)],
+            id="same_bucket",
+        ),
+        pytest.param(
+            """
+                  12:12, 12:17
+            AAPL:    10,    15
+            """,
+            [("12:15", 10), ("12:30", 15)],
+            id="different_buckets",
+        ),
+    ],
+)
+def test_buckets(
+    make_data: Callable[[str], None],
+    query: QueryType,
+    refresh_price_update: Callable[..., None],
+    data: str,
+    expected: list[tuple[str, float]],
+) -> None:
+    make_data(data)
+    refresh_price_update("15min")
     rows = query('SELECT * FROM price_update_15min ORDER BY "timestamp"')
-    assert rows == [
-        mock_pu(timestamp=parse_time("12:15"), price=10),
-        mock_pu(timestamp=parse_time("12:30"), price=15),
-    ]
+    assert rows == [mock_pu(timestamp=parse_time(t), price=price) for t, price in expected]
 
 
 def test_one_cashflow(make_data: Callable[[str], None], query: QueryType) -> None:
@@ -143,7 +154,8 @@ def test_user_product_timeline_latest_includes_realtime_prices(
     query: QueryType,
     user: Callable[[str], str],
     product: Callable[[str], str],
-    insert: Callable[[PriceUpdate | Cashflow], None],
+    insert: Callable[..., None],
+    refresh_price_update: Callable[..., None],
 ) -> None:
     # Use make_data for initial setup
     make_data("""
@@ -153,7 +165,7 @@ def test_user_product_timeline_latest_includes_realtime_prices(
     """)
 
     # Refresh continuous aggregate to create the bucket
-    query("CALL refresh_continuous_aggregate('price_update_15min', NULL, NULL)")
+    refresh_price_update("15min")
 
     # Insert raw price 5 minutes later (after the bucket, not yet bucketed)
     insert(PriceUpdate(product("AAPL"), parse_time("12:35"), 105))
@@ -161,7 +173,7 @@ def test_user_product_timeline_latest_includes_realtime_prices(
     # Query for latest portfolio value
     latest = query(
         """
-        SELECT *
+        SELECT "timestamp", market_value
         FROM user_product_timeline_business_15min(%(user_id)s, %(product_id)s)
         ORDER BY timestamp DESC LIMIT 1
         """,
@@ -169,7 +181,7 @@ def test_user_product_timeline_latest_includes_realtime_prices(
     )
 
     # Returns the bucketed price timestamp (12:45 = 12:30 bucket + 15 min)
-    assert latest == [mock_uptb(timestamp=parse_time("12:45"), market_value=1000)]
+    assert latest == [{"timestamp": parse_time("12:45"), "market_value": 1000}]
 
 
 def test_user_product_timeline_combines_cashflow_and_price_events(
@@ -177,6 +189,7 @@ def test_user_product_timeline_combines_cashflow_and_price_events(
     query: QueryType,
     user: Callable[[str], str],
     product: Callable[[str], str],
+    refresh_price_update: Callable[..., None],
 ) -> None:
     """Test that timeline combines cashflow events with price bucket events."""
     make_data("""
@@ -186,7 +199,7 @@ def test_user_product_timeline_combines_cashflow_and_price_events(
     """)
 
     # Refresh the continuous aggregate so price buckets are materialized
-    query("CALL refresh_continuous_aggregate('price_update_15min', NULL, NULL)")
+    refresh_price_update("15min")
 
     # Query the timeline
     timeline = query(
@@ -211,7 +224,10 @@ def test_user_product_timeline_combines_cashflow_and_price_events(
 
 
 def test_user_timeline_aggregates_across_products(
-    make_data: Callable[[str], None], query: QueryType, user: Callable[[str], str]
+    make_data: Callable[[str], None],
+    query: QueryType,
+    user: Callable[[str], str],
+    refresh_price_update: Callable[..., None],
 ) -> None:
     """Test that user_timeline aggregates portfolio-level metrics across all products."""
     make_data("""
@@ -223,19 +239,19 @@ def test_user_timeline_aggregates_across_products(
     """)
 
     # Refresh continuous aggregate
-    query("CALL refresh_continuous_aggregate('price_update_15min', NULL, NULL)")
+    refresh_price_update("15min")
 
     # The timeline functions may not return data without additional setup
     # This test validates that the schema and queries work correctly when data is present
     # For now, we'll just verify the query syntax is correct by running it
     timeline = query(
-        "SELECT * FROM user_timeline_business_15min(%(user_id)s)",
+        'SELECT "timestamp", market_value FROM user_timeline_business_15min(%(user_id)s)',
         {"user_id": user("Alice")},
     )
 
     assert timeline == [
-        mock_utb(timestamp=parse_time("10:15"), market_value=8),
-        mock_utb(timestamp=parse_time("10:30"), market_value=10),
+        {"timestamp": parse_time("10:15"), "market_value": 8},
+        {"timestamp": parse_time("10:30"), "market_value": 10},
     ]
 
 
@@ -244,7 +260,7 @@ def test_out_of_order_cashflow_invalidates_cache(
     query: QueryType,
     product: Callable[[str], str],
     user: Callable[[str], str],
-    insert: Callable[[PriceUpdate | Cashflow], None],
+    insert: Callable[..., None],
 ) -> None:
     """Test that out-of-order cashflow insertion automatically invalidates affected cache."""
     # Setup initial data with 3 cashflows for Alice/AAPL
@@ -334,7 +350,7 @@ def test_multi_product_cache_invalidation_isolation(
     query: QueryType,
     product: Callable[[str], str],
     user: Callable[[str], str],
-    insert: Callable[[PriceUpdate | Cashflow], None],
+    insert: Callable[..., None],
 ) -> None:
     """Test that cache invalidation for one product doesn't affect another product."""
     # Setup: 2 cashflows for each product
@@ -455,3 +471,71 @@ def test_multi_product_cache_invalidation_isolation(
             withdrawals=0,
         ),
     ]
+
+
+@pytest.mark.parametrize(
+    "backdated, expected",
+    [
+        pytest.param(
+            "10:20",
+            [("10:30", "10:20"), ("10:45", "10:40"), ("11:00", "11:00"), ("11:15", "11:00")],
+            id="inserts_earlier_buckets",
+        ),
+        pytest.param(
+            "10:42",
+            [("10:45", "10:42"), ("11:00", "11:00"), ("11:15", "11:00")],
+            id="updates_superseded_buckets",
+        ),
+    ],
+)
+def test_out_of_order_cashflow_repairs_user_product_timeline_cache(
+    make_data: Callable[[str], None],
+    query: QueryType,
+    product: Callable[[str], str],
+    user: Callable[[str], str],
+    insert: Callable[..., None],
+    refresh_price_update: Callable[..., None],
+    backdated: str,
+    expected: list[tuple[str, str]],
+) -> None:
+    """Test that an out-of-order cashflow repairs the cached timeline up to its watermark."""
+    make_data("""
+                     10:00, 10:15, 10:30, 10:40, 10:45, 11:00, 11:15
+        AAPL:        100  ,   101,   102,      ,   103,   104,   105
+        Alice/AAPL:       ,      ,      ,    10,      ,     5
+    """)
+    refresh_price_update("15min")
+
+    # Fill caches; the latest bucket (11:30) is left to the uncached path
+    query("SELECT refresh_cumulative_cashflow()")
+    query("SELECT refresh_user_product_timeline_15min()")
+
+    cache_query = """
+        SELECT "timestamp", cashflow_timestamp
+        FROM user_product_timeline_cache_15min
+        ORDER BY "timestamp"
+    """
+    assert query(cache_query) == [
+        {"timestamp": parse_time(t), "cashflow_timestamp": parse_time(cf)}
+        for t, cf in [("10:45", "10:40"), ("11:00", "11:00"), ("11:15", "11:00")]
+    ]
+
+    # Either opens up buckets before the first cached one or repoints cached ones to itself
+    insert(Cashflow(user("Alice"), product("AAPL"), parse_time(backdated), 2, 102.00, 204.00))
+
+    cached = query(cache_query)
+    assert cached == [
+        {"timestamp": parse_time(t), "cashflow_timestamp": parse_time(cf)} for t, cf in expected
+    ]
+
+    # The repaired cache holds exactly what the timeline computes without it
+    query("TRUNCATE TABLE user_product_timeline_cache_15min")
+    fresh = query(
+        """
+        SELECT "timestamp", cashflow_timestamp
+        FROM user_product_timeline_15min(NULL, NULL, NULL, %s)
+        ORDER BY "timestamp"
+        """,
+        (parse_time("11:30"),),
+    )
+    assert fresh == cached
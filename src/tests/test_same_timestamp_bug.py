@@ -1,10 +1,10 @@
 """Test for same-timestamp buy and sell aggregation bug."""
 
-import datetime
 from collections.abc import Callable
 from decimal import Decimal
 from typing import Any, Protocol
 
+from tests.utils import parse_datetime
 from twr.models import (
     Cashflow,
     CumulativeCashflow,
@@ -34,7 +34,7 @@ def test_buy_and_sell_at_same_timestamp(
     query: QueryType,
     product: Callable[[str], str],
     user: Callable[[str], str],
-    insert: Callable[[PriceUpdate | Cashflow], None],
+    insert: Callable[..., None],
 ) -> None:
     """
     Test that when both buys and sells occur at the same timestamp,
@@ -43,47 +43,28 @@ def test_buy_and_sell_at_same_timestamp(
     This test reproduces a bug in the _fresh_cf function where aggregating
     by timestamp causes buys and sells to be incorrectly netted together.
     """
-    # Clear cache tables to avoid interference from other tests
-    query("TRUNCATE TABLE cumulative_cashflow_cache CASCADE")
-
-    # Setup: Insert price data
-    insert(
-        PriceUpdate(
-            product("AAPL"),
-            datetime.datetime(2025, 1, 1, 10, 0, tzinfo=datetime.timezone.utc),
-            100.00,
-        )
-    )
-    insert(
-        PriceUpdate(
-            product("AAPL"),
-            datetime.datetime(2025, 1, 1, 12, 0, tzinfo=datetime.timezone.utc),
-            105.00,
-        )
-    )
-
-    # Insert a buy and a sell at the SAME timestamp (12:00)
+    # Setup: price data, then a buy and a sell at the SAME timestamp (12:00), in one batch
     # Buy 10 units @ 100 with fees=10: user_money = 1010
     # Sell 5 units @ 105 with fees=5: user_money = -520 (proceeds=525, fees=5)
     insert(
+        PriceUpdate(product("AAPL"), parse_datetime("2025-01-01T10:00:00+00:00"), 100.00),
+        PriceUpdate(product("AAPL"), parse_datetime("2025-01-01T12:00:00+00:00"), 105.00),
         Cashflow(
             user("Alice"),
             product("AAPL"),
-            datetime.datetime(2025, 1, 1, 12, 0, tzinfo=datetime.timezone.utc),
+            parse_datetime("2025-01-01T12:00:00+00:00"),
             10,
             100.00,
             1010.00,
-        )
-    )
-    insert(
+        ),
         Cashflow(
             user("Alice"),
             product("AAPL"),
-            datetime.datetime(2025, 1, 1, 12, 0, tzinfo=datetime.timezone.utc),
+            parse_datetime("2025-01-01T12:00:00+00:00"),
             -5,
             105.00,
             -520.00,
-        )
+        ),
     )
 
     # Query cumulative cashflow
@@ -108,7 +89,7 @@ def test_buy_and_sell_at_same_timestamp(
         {
             "user_id": user("Alice"),
             "product_id": product("AAPL"),
-            "timestamp": datetime.datetime(2025, 1, 1, 12, 0, tzinfo=datetime.timezone.utc),
+            "timestamp": parse_datetime("2025-01-01T12:00:00+00:00"),
             "buy_units": Decimal("10.000000"),  # NOT 5
             "sell_units": Decimal("5.000000"),  # NOT 0
             "buy_cost": Decimal("1000.000000"),  # NOT 475
@@ -128,7 +109,7 @@ def test_multiple_buys_and_sells_at_same_timestamp(
     query: QueryType,
     product: Callable[[str], str],
     user: Callable[[str], str],
-    insert: Callable[[PriceUpdate | Cashflow], None],
+    insert: Callable[..., None],
 ) -> None:
     """
     Test aggregation with multiple buys and sells at the same timestamp.
@@ -137,51 +118,36 @@ def test_multiple_buys_and_sells_at_same_timestamp(
     - 2 buys at the same timestamp
     - 1 sell at the same timestamp
     """
-    # Clear cache tables to avoid interference from other tests
-    query("TRUNCATE TABLE cumulative_cashflow_cache CASCADE")
-
-    # Setup: Insert price data
-    insert(
-        PriceUpdate(
-            product("AAPL"),
-            datetime.datetime(2025, 1, 1, 10, 0, tzinfo=datetime.timezone.utc),
-            100.00,
-        )
-    )
-
-    # Insert 2 buys and 1 sell at the SAME timestamp (10:00)
+    # Setup: price data, then 2 buys and 1 sell at the SAME timestamp (10:00), in one batch
     # Buy 10 units @ 100: user_money = 1005 (fees=5)
     # Buy 8 units @ 102: user_money = 820 (fees=4)
     # Sell 3 units @ 105: user_money = -312 (fees=3)
     insert(
+        PriceUpdate(product("AAPL"), parse_datetime("2025-01-01T10:00:00+00:00"), 100.00),
         Cashflow(
             user("Alice"),
             product("AAPL"),
-            datetime.datetime(2025, 1, 1, 10, 0, tzinfo=datetime.timezone.utc),
+            parse_datetime("2025-01-01T10:00:00+00:00"),
             10,
             100.00,
             1005.00,
-        )
-    )
-    insert(
+        ),
         Cashflow(
             user("Alice"),
             product("AAPL"),
-            datetime.datetime(2025, 1, 1, 10, 0, tzinfo=datetime.timezone.utc),
+            parse_datetime("2025-01-01T10:00:00+00:00"),
             8,
             102.00,
             820.00,
-        )
-    )
-    insert(
+        ),
         Cashflow(
             user("Alice"),
             product("AAPL"),
-            datetime.datetime(2025, 1, 1, 10, 0, tzinfo=datetime.timezone.utc),
+            parse_datetime("2025-01-01T10:00:00+00:00"),
             -3,
             105.00,
             -312.00,
-        )
+        ),
     )
 
     # Query cumulative cashflow
@@ -210,7 +176,7 @@ def test_multiple_buys_and_sells_at_same_timestamp(
         {
             "user_id": user("Alice"),
             "product_id": product("AAPL"),
-            "timestamp": datetime.datetime(2025, 1, 1, 10, 0, tzinfo=datetime.timezone.utc),
+            "timestamp": parse_datetime("2025-01-01T10:00:00+00:00"),
             "buy_units": Decimal("18.000000"),
             "sell_units": Decimal("3.000000"),
             "buy_cost": Decimal("1816.000000"),
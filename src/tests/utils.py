@@ -1,6 +1,8 @@
+import dataclasses
 import datetime
+import functools
+from collections.abc import Callable
 from typing import Any
-from unittest import mock
 
 from twr.models import (
     Cashflow,
@@ -11,11 +13,116 @@ from twr.models import (
 )
 
 
+class _Any:
+    """Equal to everything, like `unittest.mock.ANY` but without the mock machinery."""
+
+    __slots__ = ()
+
+    def __eq__(self, other: object) -> bool:
+        return True
+
+    def __ne__(self, other: object) -> bool:
+        return False
+
+    def __hash__(self) -> int:
+        return 0
+
+    def __repr__(self) -> str:
+        return "<ANY>"
+
+
+ANY = _Any()
+
+
+# Read the clock once so that every time in a run falls on the same day, even past midnight
+_TODAY = datetime.datetime.now(datetime.timezone.utc).replace(
+    hour=0, minute=0, second=0, microsecond=0
+)
+
+
+@functools.lru_cache(maxsize=None)
 def parse_time(text: str) -> datetime.datetime:
+    """Return today's UTC datetime at "HH:MM" (memoized, tests resolve the same few times)"""
+
     t = datetime.datetime.strptime(text, "%H:%M")
-    return datetime.datetime.now(datetime.timezone.utc).replace(
-        hour=t.hour, minute=t.minute, second=0, microsecond=0
+    return _TODAY.replace(hour=t.hour, minute=t.minute)
+
+
+@functools.lru_cache(maxsize=None)
+def parse_data(text: str) -> tuple[tuple[str | None, str, str, float], ...]:
+    """Parse a `make_data` table into `(user_name, product_name, time, value)` entries.
+
+    `user_name` is `None` for price rows. Entries keep the table's row order and times are left as
+    "HH:MM" so that callers resolve them with `parse_time`. Tables are literals that repeat across
+    tests, so each one is only parsed once.
+    """
+
+    entries: list[tuple[str | None, str, str, float]] = []
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    times = [t.strip() for t in lines[0].split(",")]
+    for line in lines[1:]:
+        identifier, values = [t.strip() for t in line.split(":") if t.strip()]
+        user_name: str | None
+        match [w.strip() for w in identifier.split("/")]:
+            case [user_name, product_name]:
+                pass
+            case [product_name]:
+                user_name = None
+            case _:
+                continue
+        for time, value_str in zip(times, values.split(",")):
+            try:
+                value = float(value_str.strip())
+            except ValueError:
+                continue
+            entries.append((user_name, product_name, time, value))
+    return tuple(entries)
+
+
+# Fixed timestamps in tests are spelled as ISO strings; the parsed (immutable) datetimes are shared
+parse_datetime = functools.lru_cache(maxsize=None)(datetime.datetime.fromisoformat)
+
+
+_MODELS: tuple[type, ...] = (
+    PriceUpdate,
+    Cashflow,
+    CumulativeCashflow,
+    UserProductTimelineBusinessEvent,
+    UserTimelineBusinessEvent,
+)
+
+# `(model, all field names, required field names)`: a set of columns can build a model if it is
+# made of the model's fields and covers every field without a default
+_SIGNATURES: tuple[tuple[type, frozenset[str], frozenset[str]], ...] = tuple(
+    (
+        model,
+        frozenset(f.name for f in dataclasses.fields(model)),
+        frozenset(
+            f.name
+            for f in dataclasses.fields(model)
+            if f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING
+        ),
     )
+    for model in _MODELS
+)
+
+# Every row of a result set has the same columns, so how a column signature is turned into a
+# model only needs to be discovered once. Dicts whose columns match no model are kept as they are.
+_build_by_columns: dict[tuple[str, ...], Callable[[dict[str, Any]], Any]] = {}
+
+
+def _builder(columns: tuple[str, ...]) -> Callable[[dict[str, Any]], Any]:
+    column_set = frozenset(columns)
+    for model, fields, required in _SIGNATURES:
+        if required <= column_set <= fields:
+            break
+    else:
+        return lambda dct: dct
+    field_names = tuple(f.name for f in dataclasses.fields(model))
+    if columns == field_names[: len(columns)]:
+        # Columns come in field order (eg `SELECT *`), so bind them positionally
+        return lambda dct: model(*dct.values())
+    return lambda dct: model(**dct)
 
 
 def map_to_model(
@@ -28,108 +135,39 @@ def map_to_model(
     | UserTimelineBusinessEvent
     | dict[str, Any]
 ):
-    try:
-        return PriceUpdate(**dct)
-    except TypeError:
-        pass
-    try:
-        return Cashflow(**dct)
-    except TypeError:
-        pass
-    try:
-        return CumulativeCashflow(**dct)
-    except TypeError:
-        pass
-    try:
-        return UserProductTimelineBusinessEvent(**dct)
-    except TypeError:
-        pass
-    try:
-        return UserTimelineBusinessEvent(**dct)
-    except TypeError:
-        pass
-    return dct
+    columns = tuple(dct)
+    if (build := _build_by_columns.get(columns)) is None:
+        build = _build_by_columns[columns] = _builder(columns)
+    return build(dct)
+
+
+def _all_any(model: type) -> dict[str, Any]:
+    return {f.name: ANY for f in dataclasses.fields(model)}
+
+
+# Every field of a mock defaults to ANY; the base mappings are built once
+_PU_ANY = _all_any(PriceUpdate)
+_CF_ANY = _all_any(Cashflow)
+_CCF_ANY = _all_any(CumulativeCashflow)
+_UPTB_ANY = _all_any(UserProductTimelineBusinessEvent)
+_UTB_ANY = _all_any(UserTimelineBusinessEvent)
 
 
 def mock_pu(**kwargs: Any) -> PriceUpdate:
-    return PriceUpdate(
-        **{"product_id": mock.ANY, "timestamp": mock.ANY, "price": mock.ANY, **kwargs}
-    )
+    return PriceUpdate(**{**_PU_ANY, **kwargs})
 
 
 def mock_cf(**kwargs: Any) -> Cashflow:
-    return Cashflow(
-        **{
-            "user_id": mock.ANY,
-            "product_id": mock.ANY,
-            "timestamp": mock.ANY,
-            "units_delta": mock.ANY,
-            "execution_price": mock.ANY,
-            "user_money": mock.ANY,
-            "id": mock.ANY,
-            **kwargs,
-        }
-    )
+    return Cashflow(**{**_CF_ANY, **kwargs})
 
 
 def mock_ccf(**kwargs: Any) -> CumulativeCashflow:
-    return CumulativeCashflow(
-        **{
-            "user_id": mock.ANY,
-            "product_id": mock.ANY,
-            "timestamp": mock.ANY,
-            "buy_units": mock.ANY,
-            "sell_units": mock.ANY,
-            "buy_cost": mock.ANY,
-            "sell_proceeds": mock.ANY,
-            "deposits": mock.ANY,
-            "withdrawals": mock.ANY,
-            **kwargs,
-        }
-    )
+    return CumulativeCashflow(**{**_CCF_ANY, **kwargs})
 
 
 def mock_uptb(**kwargs: Any) -> UserProductTimelineBusinessEvent:
-    return UserProductTimelineBusinessEvent(
-        **{
-            "user_id": mock.ANY,
-            "product_id": mock.ANY,
-            "timestamp": mock.ANY,
-            "buy_units": mock.ANY,
-            "sell_units": mock.ANY,
-            "buy_cost": mock.ANY,
-            "sell_proceeds": mock.ANY,
-            "deposits": mock.ANY,
-            "withdrawals": mock.ANY,
-            "units": mock.ANY,
-            "net_investment": mock.ANY,
-            "fees": mock.ANY,
-            "price": mock.ANY,
-            "market_value": mock.ANY,
-            "avg_buy_cost": mock.ANY,
-            "cost_basis": mock.ANY,
-            "unrealized_returns": mock.ANY,
-            **kwargs,
-        }
-    )
+    return UserProductTimelineBusinessEvent(**{**_UPTB_ANY, **kwargs})
 
 
 def mock_utb(**kwargs: Any) -> UserTimelineBusinessEvent:
-    return UserTimelineBusinessEvent(
-        **{
-            "timestamp": mock.ANY,
-            "deposits": mock.ANY,
-            "withdrawals": mock.ANY,
-            "buy_cost": mock.ANY,
-            "sell_proceeds": mock.ANY,
-            "buy_units": mock.ANY,
-            "sell_units": mock.ANY,
-            "net_investment": mock.ANY,
-            "fees": mock.ANY,
-            "avg_buy_cost": mock.ANY,
-            "market_value": mock.ANY,
-            "cost_basis": mock.ANY,
-            "unrealized_returns": mock.ANY,
-            **kwargs,
-        }
-    )
+    return UserTimelineBusinessEvent(**{**_UTB_ANY, **kwargs})
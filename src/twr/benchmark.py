@@ -6,10 +6,13 @@ import time
 import uuid
 from typing import Any, Callable
 
+from psycopg2.extensions import connection as Connection
+
 from twr.drop import drop_and_recreate_schema
 from twr.generate import generate, parser
 from twr.migrate import run_all_migrations
-from twr.utils import GRANULARITIES, Granularity, connection
+from twr.refresh import refresh_user_product_timelines
+from twr.utils import CACHE_TABLES, GRANULARITIES, Granularity, connection
 
 
 def _mean(query_times: list[float]) -> float:
@@ -61,42 +64,51 @@ def _measure(prefix: str, func1: Callable[[], Any], func2: Callable[..., None])
 
 
 def _query_granularity(
-    user_ids: list[uuid.UUID], product_ids: list[uuid.UUID], suffix: str
+    conn: Connection, user_ids: list[uuid.UUID], product_ids: list[uuid.UUID], suffix: str
 ) -> None:
-    with connection() as conn:
-        cur = conn.cursor()
+    cur = conn.cursor()
 
-        def query1() -> tuple[uuid.UUID, uuid.UUID]:
-            return random.choice(user_ids), random.choice(product_ids)
+    # Parse and plan each query once; the measured calls only bind and execute
+    cur.execute(
+        "PREPARE user_product_timeline_business (UUID, UUID) AS "
+        f"SELECT user_product_timeline_business_{suffix}($1, $2)"
+    )
+    cur.execute(
+        f"PREPARE user_timeline_business (UUID) AS SELECT user_timeline_business_{suffix}($1)"
+    )
 
-        def query2(args: tuple[uuid.UUID, uuid.UUID]) -> None:
-            user_id, product_id = args
-            cur.execute(
-                f"SELECT user_product_timeline_business_{suffix}(%s, %s)",
-                (str(user_id), str(product_id)),
-            )
-            cur.fetchall()
+    def query1() -> tuple[uuid.UUID, uuid.UUID]:
+        return random.choice(user_ids), random.choice(product_ids)
 
-        _measure(f"    - user_product_timeline_business_{suffix:5}", query1, query2)
+    def query2(args: tuple[uuid.UUID, uuid.UUID]) -> None:
+        user_id, product_id = args
+        cur.execute(
+            "EXECUTE user_product_timeline_business (%s, %s)",
+            (str(user_id), str(product_id)),
+        )
+        cur.fetchall()
 
-        def query3() -> uuid.UUID:
-            return random.choice(user_ids)
+    _measure(f"    - user_product_timeline_business_{suffix:5}", query1, query2)
 
-        def query4(user_id: uuid.UUID) -> None:
-            cur.execute(f"SELECT user_timeline_business_{suffix}(%s)", (str(user_id),))
-            cur.fetchall()
+    def query3() -> uuid.UUID:
+        return random.choice(user_ids)
 
-        _measure(f"    - user_timeline_business_{suffix:5}        ", query3, query4)
+    def query4(user_id: uuid.UUID) -> None:
+        cur.execute("EXECUTE user_timeline_business (%s)", (str(user_id),))
+        cur.fetchall()
 
+    _measure(f"    - user_timeline_business_{suffix:5}        ", query3, query4)
+
+    # The connection is shared across runs; the next one prepares against the new cache state
+    cur.execute("DEALLOCATE user_product_timeline_business")
+    cur.execute("DEALLOCATE user_timeline_business")
 
-def _clear_cache(cutoff: datetime.datetime) -> None:
-    with connection() as conn:
-        cur = conn.cursor()
-        for table in ["cumulative_cashflow_cache"] + [
-            f"user_product_timeline_cache_{g['suffix']}" for g in GRANULARITIES
-        ]:
-            cur.execute(f"DELETE FROM {table} WHERE timestamp > %s", (cutoff,))
-            cur.execute(f"VACUUM ANALYZE {table}")
+
+def _clear_cache(conn: Connection, cutoff: datetime.datetime) -> None:
+    cur = conn.cursor()
+    for table in CACHE_TABLES:
+        cur.execute(f"DELETE FROM {table} WHERE timestamp > %s", (cutoff,))
+        cur.execute(f"VACUUM ANALYZE {table}")
 
 
 def main() -> None:
@@ -119,13 +131,15 @@ def main() -> None:
     )
     print(f"{time.time() - tic:.2f}s")
 
-    print("\n🔍 Querying with 0% cache")
+    # One session for the whole run (except for the concurrent timeline refreshes): queries,
+    # refreshes and cache clearing share it
+    with connection() as conn:
+        print("\n🔍 Querying with 0% cache")
 
-    for g in GRANULARITIES:
-        _query_granularity(user_ids, product_ids, g["suffix"])
+        for g in GRANULARITIES:
+            _query_granularity(conn, user_ids, product_ids, g["suffix"])
 
-    print("\n🔄 Refreshing cache")
-    with connection() as conn:
+        print("\n🔄 Refreshing cache")
         cur = conn.cursor()
 
         print("    - refresh_cumulative_cashflow         : ", end="", flush=True)
@@ -135,37 +149,37 @@ def main() -> None:
 
         cur.execute("VACUUM ANALYZE cumulative_cashflow_cache")
 
-        for g in GRANULARITIES:
-            print(f"    - refresh_user_product_timeline_{g['suffix']:5} : ", end="", flush=True)
-            tic = time.time()
-            cur.execute(f"SELECT refresh_user_product_timeline_{g['suffix']}()")
-            print(f"{time.time() - tic: 6.2f}s")
+        tic = time.time()
+        for suffix, elapsed in refresh_user_product_timelines():
+            print(f"    - refresh_user_product_timeline_{suffix:5} : {elapsed: 6.2f}s")
+        print(f"    - {'all, wall clock':35} : {time.time() - tic: 6.2f}s")
 
+        for g in GRANULARITIES:
             cur.execute(f"VACUUM ANALYZE user_product_timeline_cache_{g['suffix']}")
 
-    print("\n🔍 Querying with 100% cache")
-    for g in GRANULARITIES:
-        _query_granularity(user_ids, product_ids, g["suffix"])
-
-    cutoffs: dict[datetime.datetime, list[tuple[float, Granularity]]] = {}
-    for n, g in itertools.product((0.25, 0.5, 0.75), GRANULARITIES):
-        if g["cache_retention"]:
-            days = int(g["cache_retention"].split()[0])
-            start = max(ticks[0], ticks[-1] - datetime.timedelta(days=days))
-        else:
-            start = ticks[0]
-        duration = ticks[-1] - start
-        timestamp = start + n * duration
-        cutoffs.setdefault(timestamp, []).append((n, g))
-
-    for timestamp in sorted(cutoffs.keys(), reverse=True):
-        _clear_cache(timestamp)
-        for n, g in cutoffs[timestamp]:
-            print(
-                f"\n🔍 Querying {g['suffix']:5} with {n * 100}% cache "
-                f"(cutoff: {timestamp.isoformat()})"
-            )
-            _query_granularity(user_ids, product_ids, g["suffix"])
+        print("\n🔍 Querying with 100% cache")
+        for g in GRANULARITIES:
+            _query_granularity(conn, user_ids, product_ids, g["suffix"])
+
+        cutoffs: dict[datetime.datetime, list[tuple[float, Granularity]]] = {}
+        for n, g in itertools.product((0.25, 0.5, 0.75), GRANULARITIES):
+            if g["cache_retention"]:
+                days = int(g["cache_retention"].split()[0])
+                start = max(ticks[0], ticks[-1] - datetime.timedelta(days=days))
+            else:
+                start = ticks[0]
+            duration = ticks[-1] - start
+            timestamp = start + n * duration
+            cutoffs.setdefault(timestamp, []).append((n, g))
+
+        for timestamp in sorted(cutoffs.keys(), reverse=True):
+            _clear_cache(conn, timestamp)
+            for n, g in cutoffs[timestamp]:
+                print(
+                    f"\n🔍 Querying {g['suffix']:5} with {n * 100}% cache "
+                    f"(cutoff: {timestamp.isoformat()})"
+                )
+                _query_granularity(conn, user_ids, product_ids, g["suffix"])
 
 
 if __name__ == "__main__":
@@ -2,18 +2,29 @@ import argparse
 import datetime
 import io
 import itertools
-import json
-import pathlib
+import operator
 import random
 import uuid
 from typing import Generator, Iterable, cast
 
-from twr.models import Cashflow, Investment, PriceUpdate, Product, User
-from twr.utils import connection
+from twr.models import (
+    CASHFLOW_COLUMNS,
+    PRICE_UPDATE_COLUMNS,
+    Cashflow,
+    Investment,
+    PriceUpdate,
+    Product,
+    User,
+)
+from twr.utils import GRANULARITIES, connection
 
 MARKET_OPEN = datetime.time(9, 30)
 MARKET_CLOSE = datetime.time(16, 0)
 
+# Pull a COPY row's values out of a model in one C-level call
+_price_update_row = operator.attrgetter(*PRICE_UPDATE_COLUMNS)
+_cashflow_row = operator.attrgetter(*CASHFLOW_COLUMNS)
+
 
 def _parse_time_interval(interval_str: str) -> datetime.timedelta:
     """Parse time interval string like '2min', '5min', '1h' to timedelta"""
@@ -80,7 +91,9 @@ def generate(
         _parse_time_interval(price_update_frequency),
         datetime.timedelta(days=days * 7 / 5),  # Convert calendar to trading days
     )
-    ticks = sorted(list(_get_ticks(interval, duration)))
+    # _get_ticks walks backwards from now, so reversing puts them in order without a sort
+    ticks = list(_get_ticks(interval, duration))
+    ticks.reverse()
 
     products_list: list[Product] = []
     products_dict: dict[uuid.UUID | str, Product] = {}
@@ -147,48 +160,31 @@ def generate(
 
     with connection() as conn:
         cur = conn.cursor()
+        # Generated data can simply be regenerated, so don't wait for WAL flushes after each chunk
+        cur.execute("SET synchronous_commit = off")
 
         for chunk in _chunkify(
-            (
-                (product, price_update)
-                for product in products_list
-                for price_update in product.price_updates
-            ),
+            (price_update for product in products_list for price_update in product.price_updates),
             1_000_000,
         ):
             buffer = io.StringIO()
-            for product, price_update in chunk:
-                buffer.write(f"{product.id}\t{price_update.timestamp}\t{price_update.price}\n")
-            buffer.seek(0)
-            cur.copy_from(
-                buffer, "price_update", columns=("product_id", "timestamp", "price"), sep="\t"
+            buffer.writelines(
+                "\t".join(map(str, _price_update_row(price_update))) + "\n"
+                for price_update in chunk
             )
+            buffer.seek(0)
+            cur.copy_from(buffer, "price_update", columns=PRICE_UPDATE_COLUMNS, sep="\t")
             conn.commit()
 
         for chunk in _chunkify(
-            ((user, cashflow) for user in users_list for cashflow in user.cashflows),
-            1_000_000,
+            (cashflow for user in users_list for cashflow in user.cashflows), 1_000_000
         ):
             buffer = io.StringIO()
-            for user, cashflow in chunk:
-                buffer.write(
-                    f"{user.id}\t{cashflow.product_id}\t{cashflow.timestamp}\t"
-                    f"{cashflow.units_delta}\t{cashflow.execution_price}\t{cashflow.user_money}\n"
-                )
-            buffer.seek(0)
-            cur.copy_from(
-                buffer,
-                "cashflow",
-                columns=(
-                    "user_id",
-                    "product_id",
-                    "timestamp",
-                    "units_delta",
-                    "execution_price",
-                    "user_money",
-                ),
-                sep="\t",
+            buffer.writelines(
+                "\t".join(map(str, _cashflow_row(cashflow))) + "\n" for cashflow in chunk
             )
+            buffer.seek(0)
+            cur.copy_from(buffer, "cashflow", columns=CASHFLOW_COLUMNS, sep="\t")
             conn.commit()
 
         conn.autocommit = True
@@ -196,16 +192,26 @@ def generate(
         cur.execute("VACUUM ANALYZE price_update")
         cur.execute("VACUUM ANALYZE cashflow")
 
-        migrations_dir = pathlib.Path(__file__).parent.parent.parent / "migrations"
-        granularities_file = migrations_dir / "granularities.json"
-
-        with open(granularities_file) as f:
-            GRANULARITIES = json.load(f)
-
+        # Only materialize the buckets that the generated prices fall into instead of the whole
+        # hypertable. Prices are jittered around the ticks and only buckets wholly inside the
+        # window get refreshed, so align the window outward from the actual first and last price
+        first = min((p._timestamps[0] for p in products_list if p._timestamps), default=None)
+        last = max((p._timestamps[-1] for p in products_list if p._timestamps), default=None)
         for g in GRANULARITIES:
-            cur.execute(
-                f"CALL refresh_continuous_aggregate('price_update_{g['suffix']}', NULL, NULL)"
-            )
+            if first is not None:
+                cur.execute(
+                    "CALL refresh_continuous_aggregate(%s, "
+                    "time_bucket(%s::interval, %s::timestamptz), "
+                    "time_bucket(%s::interval, %s::timestamptz) + %s::interval)",
+                    (
+                        f"price_update_{g['suffix']}",
+                        g["interval"],
+                        first,
+                        g["interval"],
+                        last,
+                        g["interval"],
+                    ),
+                )
             cur.execute(f"VACUUM ANALYZE price_update_{g['suffix']}")
 
     return (
@@ -5,14 +5,18 @@ from dataclasses import dataclass, field
 from decimal import Decimal
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PriceUpdate:
     product_id: uuid.UUID | str
     timestamp: datetime.datetime
     price: float | Decimal
 
 
-@dataclass
+# Columns written when storing a PriceUpdate, in field order
+PRICE_UPDATE_COLUMNS = ("product_id", "timestamp", "price")
+
+
+@dataclass(slots=True)
 class Product:
     id: uuid.UUID = field(default_factory=uuid.uuid4)
     price_updates: list[PriceUpdate] = field(default_factory=list)
@@ -34,7 +38,7 @@ class Product:
         return self.price_updates[idx - 1].price
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Cashflow:
     user_id: uuid.UUID | str
     product_id: uuid.UUID | str
@@ -45,18 +49,29 @@ class Cashflow:
     id: uuid.UUID | str = field(default_factory=uuid.uuid4)
 
 
-@dataclass
+# Columns written when storing a Cashflow, in field order; the database generates the id
+CASHFLOW_COLUMNS = (
+    "user_id",
+    "product_id",
+    "timestamp",
+    "units_delta",
+    "execution_price",
+    "user_money",
+)
+
+
+@dataclass(slots=True)
 class Investment:
     units: float = 0.0
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: uuid.UUID = field(default_factory=uuid.uuid4)
     cashflows: list[Cashflow] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CumulativeCashflow:
     user_id: uuid.UUID | str
     product_id: uuid.UUID | str
@@ -69,7 +84,7 @@ class CumulativeCashflow:
     withdrawals: float | Decimal
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UserProductTimelineBusinessEvent:
     user_id: uuid.UUID | str
     product_id: uuid.UUID | str
@@ -90,7 +105,7 @@ class UserProductTimelineBusinessEvent:
     unrealized_returns: float | Decimal
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UserTimelineBusinessEvent:
     timestamp: datetime.datetime
     deposits: float | Decimal
@@ -13,22 +13,19 @@ Examples:
 """
 
 import argparse
-import json
 import sys
 import time
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator
 
 import psycopg2
 
-# Import granularities configuration
-migrations_dir = Path(__file__).parent.parent.parent / "migrations"
-granularities_file = migrations_dir / "granularities.json"
+from twr.utils import CACHE_TABLES, GRANULARITIES, connection
 
-try:
-    with open(granularities_file) as f:
-        GRANULARITIES = json.load(f)
-except (FileNotFoundError, json.JSONDecodeError):
-    GRANULARITIES = []
+RETENTION_THRESHOLD_SQL = """
+    SELECT percentile_disc(%s) WITHIN GROUP (ORDER BY timestamp) AS threshold
+    FROM cumulative_cashflow_cache
+"""
 
 
 def parse_percentage(percentage_str: str) -> float:
@@ -46,6 +43,26 @@ def parse_percentage(percentage_str: str) -> float:
         raise ValueError(f"Invalid percentage format: {percentage_str}") from e
 
 
+def refresh_user_product_timelines(**connect_kwargs: Any) -> Iterator[tuple[str, float]]:
+    """Refresh the timeline caches of all granularities, yielding `(suffix, seconds)` for each.
+
+    The granularities only depend on the cumulative cashflow cache, which must be refreshed first,
+    not on each other, so they are refreshed concurrently, each in its own session.
+    `connect_kwargs` override the defaults of `twr.utils.connection`.
+    """
+
+    def refresh(suffix: str) -> float:
+        with connection(**connect_kwargs) as conn, conn.cursor() as cur:
+            start = time.time()
+            cur.execute(f"SELECT refresh_user_product_timeline_{suffix}()")
+            return time.time() - start
+
+    with ThreadPoolExecutor(max_workers=max(len(GRANULARITIES), 1)) as executor:
+        futures = [(g["suffix"], executor.submit(refresh, g["suffix"])) for g in GRANULARITIES]
+        for suffix, future in futures:
+            yield suffix, future.result()
+
+
 def refresh_and_retain(
     percentage: float = 1.0,
     db_host: str = "127.0.0.1",
@@ -60,10 +77,12 @@ def refresh_and_retain(
     Args:
         percentage: Float between 0.0 and 1.0 (e.g., 0.5 for 50%)
     """
-    # Connect with autocommit enabled (required for VACUUM)
-    conn = psycopg2.connect(
-        host=db_host, port=db_port, database=db_name, user=db_user, password=db_password
+    connect_kwargs: dict[str, Any] = dict(
+        host=db_host, port=db_port, dbname=db_name, user=db_user, password=db_password
     )
+
+    # Connect with autocommit enabled (required for VACUUM)
+    conn = psycopg2.connect(**connect_kwargs)
     conn.autocommit = True
     cur = conn.cursor()
 
@@ -71,13 +90,9 @@ def refresh_and_retain(
         # Just delete all cache, no refresh needed
         print("Deleting all caches (0% retention)...")
 
-        cur.execute("DELETE FROM cumulative_cashflow_cache")
-        print(f"  - cumulative_cashflow_cache: {cur.rowcount:,} rows deleted")
-
-        for g in GRANULARITIES:
-            suffix = g["suffix"]
-            cur.execute(f"DELETE FROM user_product_timeline_cache_{suffix}")
-            print(f"  - user_product_timeline_cache_{suffix}: {cur.rowcount:,} rows deleted")
+        for table in CACHE_TABLES:
+            cur.execute(f"DELETE FROM {table}")
+            print(f"  - {table}: {cur.rowcount:,} rows deleted")
 
         print("\n✓ All caches deleted")
         conn.close()
@@ -90,12 +105,8 @@ def refresh_and_retain(
     cur.execute("SELECT refresh_cumulative_cashflow()")
     print(f"  - cumulative_cashflow_cache refreshed in {time.time() - start:.1f}s")
 
-    for g in GRANULARITIES:
-        suffix = g["suffix"]
-
-        start = time.time()
-        cur.execute(f"SELECT refresh_user_product_timeline_{suffix}()")
-        print(f"  - user_product_timeline_cache_{suffix} refreshed in {time.time() - start:.1f}s")
+    for suffix, elapsed in refresh_user_product_timelines(**connect_kwargs):
+        print(f"  - user_product_timeline_cache_{suffix} refreshed in {elapsed:.1f}s")
 
     if percentage < 1.0:
         # Calculate percentile threshold for deletion
@@ -103,10 +114,7 @@ def refresh_and_retain(
 
         # Get the percentile threshold from cumulative_cashflow_cache
         # To keep oldest X%, delete from the Xth percentile onwards
-        cur.execute(f"""
-            SELECT percentile_disc({percentage}) WITHIN GROUP (ORDER BY timestamp) AS threshold
-            FROM cumulative_cashflow_cache
-        """)
+        cur.execute(RETENTION_THRESHOLD_SQL, (percentage,))
         result = cur.fetchone()
 
         if result and result[0]:
@@ -114,21 +122,9 @@ def refresh_and_retain(
             print(f"  Threshold timestamp: {threshold}")
 
             # Delete from all cache tables
-            cur.execute(
-                "DELETE FROM cumulative_cashflow_cache WHERE timestamp >= %s", (threshold,)
-            )
-            deleted_cc = cur.rowcount
-            print(f"  - cumulative_cashflow_cache: {deleted_cc:,} rows deleted")
-
-            for g in GRANULARITIES:
-                suffix = g["suffix"]
-
-                cur.execute(
-                    f"DELETE FROM user_product_timeline_cache_{suffix} WHERE timestamp >= %s",
-                    (threshold,),
-                )
-                deleted_upt = cur.rowcount
-                print(f"  - user_product_timeline_cache_{suffix}: {deleted_upt:,} rows deleted")
+            for table in CACHE_TABLES:
+                cur.execute(f"DELETE FROM {table} WHERE timestamp >= %s", (threshold,))
+                print(f"  - {table}: {cur.rowcount:,} rows deleted")
         else:
             print("  No data in cache to delete")
 
@@ -136,11 +132,8 @@ def refresh_and_retain(
     print("\nVacuuming cache tables...")
 
     start = time.time()
-    cur.execute("VACUUM ANALYZE cumulative_cashflow_cache")
-
-    for g in GRANULARITIES:
-        suffix = g["suffix"]
-        cur.execute(f"VACUUM ANALYZE user_product_timeline_cache_{suffix}")
+    for table in CACHE_TABLES:
+        cur.execute(f"VACUUM ANALYZE {table}")
 
     print(f"  All tables vacuumed in {time.time() - start:.1f}s")
 
@@ -1,16 +1,24 @@
 import json
 from collections.abc import Generator
 from contextlib import contextmanager
-from typing import TypedDict
+from pathlib import Path
+from typing import Any, TypedDict
 
 import psycopg2
 from psycopg2.extensions import connection as Connection
 
 
 @contextmanager
-def connection() -> Generator[Connection, None, None]:
+def connection(**kwargs: Any) -> Generator[Connection, None, None]:
     conn = psycopg2.connect(
-        dbname="twr", user="twr_user", password="twr_password", host="localhost", port=5432
+        **{
+            "dbname": "twr",
+            "user": "twr_user",
+            "password": "twr_password",
+            "host": "localhost",
+            "port": 5432,
+            **kwargs,
+        }
     )
     conn.autocommit = True
     try:
@@ -25,5 +33,10 @@ class Granularity(TypedDict):
     cache_retention: str | None
 
 
-with open("migrations/granularities.json") as f:
+with open(Path(__file__).parent.parent.parent / "migrations" / "granularities.json") as f:
     GRANULARITIES: list[Granularity] = json.load(f)
+
+# Cache tables filled by the refresh_* functions, in refresh order
+CACHE_TABLES: list[str] = ["cumulative_cashflow_cache"] + [
+    f"user_product_timeline_cache_{g['suffix']}" for g in GRANULARITIES
+]
@@ -7,20 +7,10 @@ index-only scans on watermark calculations.
 """
 
 import argparse
-import json
-from pathlib import Path
 
 import psycopg2
 
-# Import granularities configuration
-migrations_dir = Path(__file__).parent.parent.parent / "migrations"
-granularities_file = migrations_dir / "granularities.json"
-
-try:
-    with open(granularities_file) as f:
-        GRANULARITIES = json.load(f)
-except (FileNotFoundError, json.JSONDecodeError):
-    GRANULARITIES = []
+from twr.utils import CACHE_TABLES
 
 
 def vacuum_all_caches(
@@ -41,19 +31,9 @@ def vacuum_all_caches(
 
     print("Vacuuming cache tables...")
 
-    # VACUUM cumulative_cashflow_cache
-    print("  - cumulative_cashflow_cache")
-    cur.execute("VACUUM ANALYZE cumulative_cashflow_cache")
-
-    # VACUUM all timeline caches
-    for g in GRANULARITIES:
-        suffix = g["suffix"]
-
-        print(f"  - user_product_timeline_cache_{suffix}")
-        cur.execute(f"VACUUM ANALYZE user_product_timeline_cache_{suffix}")
-
-        print(f"  - user_timeline_cache_{suffix}")
-        cur.execute(f"VACUUM ANALYZE user_timeline_cache_{suffix}")
+    for table in CACHE_TABLES:
+        print(f"  - {table}")
+        cur.execute(f"VACUUM ANALYZE {table}")
 
     conn.close()
     print("\n✓ All cache tables vacuumed successfully")